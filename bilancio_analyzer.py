@@ -1,11 +1,16 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime
-import io
-import base64
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+try:
+    import python_calamine  # noqa: F401
+    EXCEL_ENGINE = 'calamine'
+except ImportError:
+    # pandas apre comunque i file con openpyxl in modalità read_only
+    EXCEL_ENGINE = 'openpyxl'
 
 # ------------------------------
 # CONFIGURAZIONE PAGINA STREAMLIT
@@ -21,24 +26,35 @@ st.set_page_config(
 # FUNZIONI DI ELABORAZIONE DATI
 # ------------------------------
 
-@st.cache_data
+@st.cache_data(show_spinner=False)
 def load_excel(file):
     """Carica il file Excel, filtra solo righe con TIPOCONTO = 'G' e pulisce."""
-    df = pd.read_excel(file, sheet_name=0, header=1)
-    df.columns = ['Mastro', 'DescrizioneMastro', 'Conto', 'DescrizioneConto',
-                  'Importo', 'SEZBIL', 'ORDINE', 'TIPOCONTO', 'I']
-    df = df[df['TIPOCONTO'] == 'G'].copy()
+    df = pd.read_excel(
+        file, sheet_name=0, header=1, engine=EXCEL_ENGINE,
+        names=['Mastro', 'DescrizioneMastro', 'Conto', 'DescrizioneConto',
+               'Importo', 'SEZBIL', 'ORDINE', 'TIPOCONTO', 'I'],
+        usecols=range(9),
+        # Con pandas >= 3 e pyarrow installato le colonne str sono già Arrow-backed
+        dtype={'Mastro': str, 'DescrizioneMastro': str, 'Conto': str,
+               'DescrizioneConto': str, 'SEZBIL': str, 'ORDINE': str,
+               'TIPOCONTO': str, 'I': str}
+    )
+    df = df[df['TIPOCONTO'] == 'G']
     df['Importo'] = pd.to_numeric(df['Importo'], errors='coerce').fillna(0)
+    df['Prefisso'] = get_prefisso(df['Conto'])
+    df['MacroSP'] = df['Prefisso'].map(_SP_MACRO)
+    df['SottoSP'] = df['Prefisso'].map(_SP_SOTTO)
+    df['VoceCE'] = df['Prefisso'].map(CE_MAP)
     return df
 
-def calcola_totale_sezione(df, sezione):
-    return df[df['SEZBIL'] == sezione]['Importo'].sum()
-
+@st.cache_data(show_spinner=False)
 def verifica_quadratura(df):
-    tot_attivo = calcola_totale_sezione(df, 'A')
-    tot_passivo = calcola_totale_sezione(df, 'P')
-    tot_ricavi = calcola_totale_sezione(df, 'R')
-    tot_costi = calcola_totale_sezione(df, 'C')
+    # Un solo passaggio su Importo per i totali di tutte le sezioni
+    totali = df.groupby('SEZBIL', sort=False)['Importo'].sum()
+    tot_attivo = totali.get('A', 0.0)
+    tot_passivo = totali.get('P', 0.0)
+    tot_ricavi = totali.get('R', 0.0)
+    tot_costi = totali.get('C', 0.0)
     utile = tot_ricavi - tot_costi
     diff_sp = tot_attivo - tot_passivo
     return {
@@ -51,6 +67,9 @@ def verifica_quadratura(df):
     }
 
 # MAPPATURE
+MACRO_SP = ['Attivo Immobilizzato', 'Attivo Circolante', 'Passivo Corrente',
+            'Passivo Consolidato', 'Patrimonio Netto']
+
 SP_MAP = {
     '01010': ('Attivo Circolante', 'Liquidità immediate'),
     '01020': ('Attivo Circolante', 'Liquidità immediate'),
@@ -80,6 +99,15 @@ SP_MAP = {
     '02130': ('Passivo Corrente', 'Ratei e risconti passivi'),
 }
 
+# SP_MAP scomposta in due Series per usarla con Series.map
+_SP_MACRO = pd.Series({p: macro for p, (macro, _) in SP_MAP.items()})
+_SP_SOTTO = pd.Series({p: sotto for p, (_, sotto) in SP_MAP.items()})
+
+# Prefissi con trattamento dedicato in riclassifica_sp (fondo ammortamento e banche)
+_SP_SKIP = frozenset({'02110', '02030', '02040'})
+_SP_BANK = frozenset({'02030', '02040'})
+_CREDITI_TRIB = '02020-'  # chiave per i saldi negativi dei debiti tributari
+
 CE_MAP = {
     '04010': 'Ricavi',
     '04013': 'Ricavi',
@@ -103,82 +131,60 @@ CE_MAP = {
     '04020': 'Proventi finanziari',
 }
 
-def get_prefisso(conto):
-    s = str(conto).strip()
-    return s[:5] if len(s) >= 5 else s
+def get_prefisso(conti):
+    """Prefisso a 5 caratteri di una Series di codici conto."""
+    return conti.astype(str).str.strip().str.slice(0, 5)
 
+@st.cache_data(show_spinner=False)
 def riclassifica_sp(df, perc_breve_banche=0.1):
-    sp = {
-        'Attivo Immobilizzato': {},
-        'Attivo Circolante': {},
-        'Passivo Corrente': {},
-        'Passivo Consolidato': {},
-        'Patrimonio Netto': {}
-    }
-    f_amm = 0.0
-    crediti_tributari = 0.0
-
-    for _, row in df.iterrows():
-        conto = row['Conto']
-        importo = row['Importo']
-        sezbil = row['SEZBIL']
-        pref = get_prefisso(conto)
-
-        if pref == '02020' and importo < 0:
-            crediti_tributari += abs(importo)
-            continue
-
-        if pref in SP_MAP:
-            macro, sotto = SP_MAP[pref]
-
-            if pref == '02110':
-                f_amm += importo
-                continue
-
-            if pref in ['02030', '02040']:
-                quota_breve = importo * perc_breve_banche
-                quota_ml = importo - quota_breve
-                if 'Debiti vs banche' not in sp['Passivo Corrente']:
-                    sp['Passivo Corrente']['Debiti vs banche'] = 0
-                sp['Passivo Corrente']['Debiti vs banche'] += quota_breve
-                if 'Debiti vs banche ML' not in sp['Passivo Consolidato']:
-                    sp['Passivo Consolidato']['Debiti vs banche ML'] = 0
-                sp['Passivo Consolidato']['Debiti vs banche ML'] += quota_ml
-                continue
-
-            if macro not in sp:
-                sp[macro] = {}
-            if sotto not in sp[macro]:
-                sp[macro][sotto] = 0
-            sp[macro][sotto] += importo
+    """Restituisce il dettaglio SP come tabella Macro/Sotto/Importo e i totali per macroclasse."""
+    pref = df['Prefisso']
+    importo = df['Importo']
+
+    # Un solo passaggio sulle righe: somma per prefisso, poi tutto lavora sui totali aggregati.
+    # I saldi negativi dei debiti tributari sono crediti: hanno una chiave a parte.
+    neg_trib = (pref == '02020') & (importo < 0)
+    per_pref = importo.groupby(pref.where(~neg_trib, _CREDITI_TRIB), sort=False).sum()
+    crediti_tributari = -per_pref.get(_CREDITI_TRIB, 0.0)
+    f_amm = per_pref.get('02110', 0.0)
+    banche = per_pref[per_pref.index.isin(_SP_BANK)]
+
+    ordinari = per_pref[~per_pref.index.isin(_SP_SKIP)]
+    parti = [pd.DataFrame({
+        'Macro': ordinari.index.map(_SP_MACRO),
+        'Sotto': ordinari.index.map(_SP_SOTTO),
+        'Importo': ordinari.values
+    }).dropna(subset=['Macro'])]
+
+    righe = []
+    if not banche.empty:
+        tot_banche = banche.sum()
+        quota_breve = tot_banche * perc_breve_banche
+        righe.append(('Passivo Corrente', 'Debiti vs banche', quota_breve))
+        righe.append(('Passivo Consolidato', 'Debiti vs banche ML', tot_banche - quota_breve))
 
     if crediti_tributari > 0:
-        if 'Crediti tributari' not in sp['Attivo Circolante']:
-            sp['Attivo Circolante']['Crediti tributari'] = 0
-        sp['Attivo Circolante']['Crediti tributari'] += crediti_tributari
-
-    if 'Immobilizzazioni materiali' in sp['Attivo Immobilizzato']:
-        sp['Attivo Immobilizzato']['Immobilizzazioni materiali'] -= f_amm
-
-    totali = {macro: sum(sp[macro].values()) for macro in sp}
+        righe.append(('Attivo Circolante', 'Crediti tributari', crediti_tributari))
+
+    if righe:
+        parti.append(pd.DataFrame(righe, columns=['Macro', 'Sotto', 'Importo']))
+    sp = pd.concat(parti, ignore_index=True)
+    sp['Macro'] = pd.Categorical(sp['Macro'], categories=MACRO_SP)
+    sp = (sp.groupby(['Macro', 'Sotto'], sort=False, observed=True, as_index=False)['Importo'].sum()
+            .sort_values('Macro', kind='stable')
+            .reset_index(drop=True))
+    sp.loc[sp['Sotto'] == 'Immobilizzazioni materiali', 'Importo'] -= f_amm
+
+    totali = sp.groupby('Macro', observed=False)['Importo'].sum().to_dict()
     return sp, totali
 
-def riclassifica_ce(df):
-    gruppi = {}
-    for _, row in df.iterrows():
-        conto = row['Conto']
-        importo = row['Importo']
-        sezbil = row['SEZBIL']
-        pref = get_prefisso(conto)
-
-        if pref in CE_MAP:
-            voce = CE_MAP[pref]
-            if voce not in gruppi:
-                gruppi[voce] = 0
-            if sezbil == 'R':
-                gruppi[voce] += importo
-            else:
-                gruppi[voce] -= importo
+@st.cache_data(show_spinner=False)
+def riclassifica_ce(df, quadratura):
+    voce = df['VoceCE']
+    segno = np.where(df['SEZBIL'].values == 'R', 1.0, -1.0)
+    importo_segno = pd.Series(df['Importo'].values * segno, index=df.index)
+    # groupby scarta le righe con voce NaN, cioè i prefissi fuori da CE_MAP
+    gruppi = importo_segno.groupby(voce).sum().to_dict()
 
     ricavi = gruppi.get('Ricavi', 0)
     rim_iniz = gruppi.get('Rimanenze iniziali', 0)
@@ -201,9 +207,7 @@ def riclassifica_ce(df):
     saldo_fin = prov_fin - oneri_fin
     risultato_ante_imposte = ebit + saldo_fin
 
-    tot_ricavi = calcola_totale_sezione(df, 'R')
-    tot_costi = calcola_totale_sezione(df, 'C')
-    utile_netto = tot_ricavi - tot_costi
+    utile_netto = quadratura['Totale Ricavi (R)'] - quadratura['Totale Costi (C)']
 
     ce = {
         'Ricavi': ricavi,
@@ -224,15 +228,17 @@ def riclassifica_ce(df):
     }
     return ce
 
+@st.cache_data(show_spinner=False)
 def calcola_kpi(sp_totali, sp_dett, ce, quadratura):
     att_circ = sp_totali.get('Attivo Circolante', 0)
     pass_corr = sp_totali.get('Passivo Corrente', 0)
-    liquidita_imm = sp_dett['Attivo Circolante'].get('Liquidità immediate', 0)
-    crediti_vs_clienti = sp_dett['Attivo Circolante'].get('Crediti vs clienti', 0)
-    crediti_vs_altri = sp_dett['Attivo Circolante'].get('Crediti vs altri', 0)
-    crediti_trib = sp_dett['Attivo Circolante'].get('Crediti tributari', 0)
+    circolante = sp_dett.loc[sp_dett['Macro'] == 'Attivo Circolante'].set_index('Sotto')['Importo']
+    liquidita_imm = circolante.get('Liquidità immediate', 0)
+    crediti_vs_clienti = circolante.get('Crediti vs clienti', 0)
+    crediti_vs_altri = circolante.get('Crediti vs altri', 0)
+    crediti_trib = circolante.get('Crediti tributari', 0)
     liquidita_diff = crediti_vs_clienti + crediti_vs_altri + crediti_trib
-    rimanenze = sp_dett['Attivo Circolante'].get('Rimanenze', 0)
+    rimanenze = circolante.get('Rimanenze', 0)
     pn = sp_totali.get('Patrimonio Netto', 0)
     pass_cons = sp_totali.get('Passivo Consolidato', 0)
     ricavi = ce.get('Ricavi', 0)
@@ -245,17 +251,17 @@ def calcola_kpi(sp_totali, sp_dett, ce, quadratura):
     tot_attivo = sp_totali.get('Attivo Immobilizzato', 0) + sp_totali.get('Attivo Circolante', 0)
     costo_venduto = ce.get('Costo del venduto', 0)
 
-    kpi = {
-        'Current ratio': att_circ / pass_corr if pass_corr != 0 else np.inf,
-        'Quick ratio': (liquidita_imm + liquidita_diff) / pass_corr if pass_corr != 0 else np.inf,
-        'Giorni credito': (crediti_vs_clienti / ricavi * 365) if ricavi != 0 else 0,
-        'Leverage': (pass_corr + pass_cons) / pn if pn != 0 else np.inf,
-        'Copertura oneri finanziari': ebitda / oneri_fin if oneri_fin != 0 else np.inf,
-        'ROE': utile / pn if pn != 0 else 0,
-        'ROI': ebit / tot_attivo if tot_attivo != 0 else 0,
-        'ROS': ebit / ricavi if ricavi != 0 else 0,
-        'Rotazione magazzino': costo_venduto / rimanenze if rimanenze != 0 else 0
-    }
+    # Numeratori, denominatori e valore di ripiego se il denominatore è zero
+    nomi = ['Current ratio', 'Quick ratio', 'Giorni credito', 'Leverage',
+            'Copertura oneri finanziari', 'ROE', 'ROI', 'ROS', 'Rotazione magazzino']
+    num = np.array([att_circ, liquidita_imm + liquidita_diff, crediti_vs_clienti * 365,
+                    pass_corr + pass_cons, ebitda, utile, ebit, ebit, costo_venduto], dtype=float)
+    den = np.array([pass_corr, pass_corr, ricavi, pn, oneri_fin, pn, tot_attivo, ricavi, rimanenze],
+                   dtype=float)
+    sentinelle = np.array([np.inf, np.inf, 0, np.inf, np.inf, 0, 0, 0, 0])
+    validi = den != 0
+    valori = np.where(validi, num / np.where(validi, den, 1), sentinelle)
+    kpi = dict(zip(nomi, valori.tolist()))
 
     soglie = {
         'Current ratio': [2, 1.5],
@@ -269,28 +275,34 @@ def calcola_kpi(sp_totali, sp_dett, ce, quadratura):
         'Rotazione magazzino': [6, 3]
     }
 
-    semafori = {}
-    for k, v in kpi.items():
-        soglia_verde, soglia_gialla = soglie[k]
-        if k in ['Giorni credito', 'Leverage']:
-            if v <= soglia_verde:
-                semafori[k] = '🟢'
-            elif v <= soglia_gialla:
-                semafori[k] = '🟡'
-            else:
-                semafori[k] = '🔴'
-        else:
-            if v >= soglia_verde:
-                semafori[k] = '🟢'
-            elif v >= soglia_gialla:
-                semafori[k] = '🟡'
-            else:
-                semafori[k] = '🔴'
+    # Giorni credito e Leverage sono migliori quando bassi: soglie con verso invertito
+    verde = np.array([soglie[k][0] for k in nomi])
+    gialla = np.array([soglie[k][1] for k in nomi])
+    inverso = np.isin(nomi, ['Giorni credito', 'Leverage'])
+    stato = np.where(
+        inverso,
+        np.select([valori <= verde, valori <= gialla], ['🟢', '🟡'], '🔴'),
+        np.select([valori >= verde, valori >= gialla], ['🟢', '🟡'], '🔴')
+    )
+    semafori = dict(zip(nomi, stato.tolist()))
     return kpi, semafori
 
+def process_file(file):
+    """Esegue l'intera pipeline su un file: caricamento, quadratura, SP, CE e KPI."""
+    df = load_excel(file)
+    quad = verifica_quadratura(df)
+    sp_dett, sp_totali = riclassifica_sp(df, perc_breve_banche=0.1)
+    ce = riclassifica_ce(df, quad)
+    kpi, semafori = calcola_kpi(sp_totali, sp_dett, ce, quad)
+    return df, quad, (sp_dett, sp_totali), ce, (kpi, semafori)
+
 # ------------------------------
 # INTERFACCIA STREAMLIT
 # ------------------------------
+def formato_numeri(*colonne, formato="%,.2f"):
+    """column_config per st.dataframe: il formato è applicato dal browser, senza costruire uno Styler."""
+    return {c: st.column_config.NumberColumn(format=formato) for c in colonne}
+
 def main():
     st.sidebar.title("📁 Caricamento Bilanci")
     uploaded_files = st.sidebar.file_uploader(
@@ -311,17 +323,28 @@ def main():
         st.session_state.kpi = {}
 
     if uploaded_files:
+        nuovi = {}
         for file in uploaded_files:
-            if file.name not in st.session_state.dataframes:
-                df = load_excel(file)
-                st.session_state.dataframes[file.name] = df
-                st.session_state.quadrature[file.name] = verifica_quadratura(df)
-                sp_dett, sp_totali = riclassifica_sp(df, perc_breve_banche=0.1)
-                st.session_state.sp[file.name] = (sp_dett, sp_totali)
-                ce = riclassifica_ce(df)
-                st.session_state.ce[file.name] = ce
-                kpi, semafori = calcola_kpi(sp_totali, sp_dett, ce, st.session_state.quadrature[file.name])
-                st.session_state.kpi[file.name] = (kpi, semafori)
+            if file.name not in st.session_state.dataframes and file.name not in nuovi:
+                nuovi[file.name] = file
+        if nuovi:
+            # Un solo spinner sul thread principale: le funzioni in cache non ne creano nei worker
+            with st.spinner("Elaborazione dei file in corso..."):
+                with ThreadPoolExecutor(max_workers=min(8, len(nuovi)),
+                                        initializer=add_script_run_ctx,
+                                        initargs=(None, get_script_run_ctx())) as ex:
+                    futures = {nome: ex.submit(process_file, file) for nome, file in nuovi.items()}
+            for nome, future in futures.items():
+                try:
+                    df, quad, sp, ce, kpi = future.result()
+                except Exception as e:
+                    st.error(f"❌ Errore nell'elaborazione di {nome}: {e}")
+                    continue
+                st.session_state.dataframes[nome] = df
+                st.session_state.quadrature[nome] = quad
+                st.session_state.sp[nome] = sp
+                st.session_state.ce[nome] = ce
+                st.session_state.kpi[nome] = kpi
 
     st.title("📋 Dashboard di Analisi Bilancio")
 
@@ -379,31 +402,27 @@ def main():
         else:
             nome_file = st.selectbox("Seleziona il file", list(st.session_state.sp.keys()))
             sp_dett, sp_totali = st.session_state.sp[nome_file]
-            for macro, classi in sp_dett.items():
+            for macro, classi in sp_dett.groupby('Macro', observed=False):
                 with st.expander(f"{macro} - Totale € {sp_totali[macro]:,.2f}", expanded=True):
-                    df_macro = pd.DataFrame([
-                        {"Sottoclasse": sotto, "Importo (€)": importo}
-                        for sotto, importo in classi.items()
-                    ])
-                    st.dataframe(df_macro.style.format({"Importo (€)": "{:,.2f}"}), use_container_width=True)
+                    df_macro = classi[['Sotto', 'Importo']].rename(
+                        columns={'Sotto': 'Sottoclasse', 'Importo': 'Importo (€)'}
+                    ).reset_index(drop=True)
+                    st.dataframe(df_macro, column_config=formato_numeri("Importo (€)"), use_container_width=True)
                     if st.button(f"🔍 Vedi conti origine per {macro}", key=f"drill_{macro}_{nome_file}"):
                         df_orig = st.session_state.dataframes[nome_file]
-                        conti_mostra = []
-                        for _, row in df_orig.iterrows():
-                            pref = get_prefisso(row['Conto'])
-                            if pref in SP_MAP:
-                                m, s = SP_MAP[pref]
-                                if m == macro and s in classi:
-                                    if pref in ['02110','02030','02040']:
-                                        continue
-                                    conti_mostra.append({
-                                        'Conto': row['Conto'],
-                                        'Descrizione': row['DescrizioneConto'],
-                                        'Importo': row['Importo']
-                                    })
-                        if conti_mostra:
+                        mask = (
+                            (df_orig['MacroSP'] == macro)
+                            & df_orig['SottoSP'].isin(classi['Sotto'])
+                            & ~df_orig['Prefisso'].isin(_SP_SKIP)
+                        )
+                        conti_mostra = (
+                            df_orig.loc[mask, ['Conto', 'DescrizioneConto', 'Importo']]
+                            .rename(columns={'DescrizioneConto': 'Descrizione'})
+                            .reset_index(drop=True)
+                        )
+                        if not conti_mostra.empty:
                             st.write("**Conti che compongono la macroclasse:**")
-                            st.dataframe(pd.DataFrame(conti_mostra).style.format({"Importo": "{:,.2f}"}))
+                            st.dataframe(conti_mostra, column_config=formato_numeri("Importo"))
                         else:
                             st.info("Nessun conto dettagliato (alcune voci sono calcoli interni).")
             tot_attivo = sp_totali.get('Attivo Immobilizzato',0) + sp_totali.get('Attivo Circolante',0)
@@ -420,29 +439,26 @@ def main():
             nome_file = st.selectbox("Seleziona il file", list(st.session_state.ce.keys()))
             ce = st.session_state.ce[nome_file]
             df_ce = pd.DataFrame(list(ce.items()), columns=["Voce", "Importo"])
-            st.dataframe(df_ce.style.format({"Importo": "{:,.2f}"}), use_container_width=True)
+            st.dataframe(df_ce, column_config=formato_numeri("Importo"), use_container_width=True)
             voci_graf = ["Ricavi", "Valore della produzione", "Margine industriale", "EBITDA", "EBIT", "Utile netto (da quadratura)"]
             df_graf = df_ce[df_ce["Voce"].isin(voci_graf)].copy()
             if not df_graf.empty:
+                import plotly.express as px  # importato solo dove servono i grafici (CE e Confronto)
                 fig = px.bar(df_graf, x="Voce", y="Importo", title="Confronto principali grandezze economiche")
                 st.plotly_chart(fig, use_container_width=True)
             if st.button("🔍 Mostra dettaglio conti per voce"):
                 df_orig = st.session_state.dataframes[nome_file]
-                conti_dettaglio = []
-                for _, row in df_orig.iterrows():
-                    pref = get_prefisso(row['Conto'])
-                    if pref in CE_MAP:
-                        voce = CE_MAP[pref]
-                        segno = 1 if row['SEZBIL'] == 'R' else -1
-                        conti_dettaglio.append({
-                            'Voce CE': voce,
-                            'Conto': row['Conto'],
-                            'Descrizione': row['DescrizioneConto'],
-                            'Importo originale': row['Importo'],
-                            'Importo con segno': row['Importo'] * segno
-                        })
-                if conti_dettaglio:
-                    st.dataframe(pd.DataFrame(conti_dettaglio).style.format({"Importo originale": "{:,.2f}", "Importo con segno": "{:,.2f}"}))
+                voci = df_orig[df_orig['VoceCE'].notna()]
+                segno = np.where(voci['SEZBIL'] == 'R', 1, -1)
+                conti_dettaglio = pd.DataFrame({
+                    'Voce CE': voci['VoceCE'],
+                    'Conto': voci['Conto'],
+                    'Descrizione': voci['DescrizioneConto'],
+                    'Importo originale': voci['Importo'],
+                    'Importo con segno': voci['Importo'] * segno
+                }).reset_index(drop=True)
+                if not conti_dettaglio.empty:
+                    st.dataframe(conti_dettaglio, column_config=formato_numeri("Importo originale", "Importo con segno"))
 
     # KPI
     elif st.session_state.pagina == "KPI":
@@ -471,7 +487,8 @@ def main():
                 kpi, _ = st.session_state.kpi[f]
                 df_conf[f] = pd.Series(kpi)
             df_conf = df_conf.T
-            st.dataframe(df_conf.style.format("{:.2f}"))
+            st.dataframe(df_conf, column_config=formato_numeri(*df_conf.columns, formato="%.2f"))
+            import plotly.express as px
             fig = px.line(df_conf.T, title="Andamento KPI")
             st.plotly_chart(fig, use_container_width=True)
 
@@ -495,19 +512,17 @@ def main():
                 st.subheader("🔍 Sintesi KPI")
                 kpi_df = pd.DataFrame(list(kpi.items()), columns=["Indice", "Valore"])
                 kpi_df["Semaforo"] = kpi_df["Indice"].map(semafori)
-                st.dataframe(kpi_df.style.format({"Valore": "{:.2f}"}))
+                st.dataframe(kpi_df, column_config=formato_numeri("Valore", formato="%.2f"))
 
                 st.subheader("🏦 Stato Patrimoniale Riclassificato")
-                sp_rows = []
-                for macro, classi in sp_dett.items():
-                    for sotto, importo in classi.items():
-                        sp_rows.append({"Macroclasse": macro, "Sottoclasse": sotto, "Importo (€)": importo})
-                sp_df = pd.DataFrame(sp_rows)
-                st.dataframe(sp_df.style.format({"Importo (€)": "{:,.2f}"}))
+                sp_df = sp_dett.rename(
+                    columns={'Macro': 'Macroclasse', 'Sotto': 'Sottoclasse', 'Importo': 'Importo (€)'}
+                )
+                st.dataframe(sp_df, column_config=formato_numeri("Importo (€)"))
 
                 st.subheader("📉 Conto Economico a Costo del Venduto")
                 ce_df = pd.DataFrame(list(ce.items()), columns=["Voce", "Importo"])
-                st.dataframe(ce_df.style.format({"Importo": "{:,.2f}"}))
+                st.dataframe(ce_df, column_config=formato_numeri("Importo"))
 
                 st.subheader("💬 Commenti strategici")
                 if kpi['Current ratio'] < 1.5:
@@ -563,7 +578,7 @@ def main():
                     st.metric("Utile/Perdita", f"€ {quad['Utile/Perdita']:,.2f}")
                 with st.expander("📋 Elenco conti con TIPOCONTO = G"):
                     df_orig = st.session_state.dataframes[nome]
-                    st.dataframe(df_orig[['Conto','DescrizioneConto','Importo','SEZBIL']].style.format({"Importo":"{:,.2f}"}))
+                    st.dataframe(df_orig[['Conto','DescrizioneConto','Importo','SEZBIL']], column_config=formato_numeri("Importo"))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file